@@ -0,0 +1,22 @@
+# Number of dataset items fetched at a time when paging through a dataset
+DATASET_PAGE_SIZE = 1000
+
+
+def iter_dataset_pages(dataset_client, page_size=DATASET_PAGE_SIZE):
+    """
+    Iterate over an Apify dataset one page at a time.
+    Args:
+        dataset_client: The Apify dataset client (e.g. apify_client.dataset(dataset_id))
+        page_size: Maximum number of items per page
+    Yields:
+        Lists of at most page_size raw items
+    """
+    offset = 0
+    while True:
+        page = dataset_client.list_items(offset=offset, limit=page_size)
+        if not page.items:
+            return
+        yield page.items
+        offset += len(page.items)
+        if len(page.items) < page_size:
+            return
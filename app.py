@@ -1,9 +1,11 @@
 from flask import Flask, render_template, request, jsonify
 import os
 from dotenv import load_dotenv
-from groq import Groq
+from groq_limiter import get_shared_client, count_tokens, INTERACTIVE
+import map_reduce
+from hashtag_index import HashtagIndex
 import json
-import subprocess
+import process_summary as summary_pipeline
 
 # Load environment variables from .env file
 load_dotenv()
@@ -21,13 +23,17 @@ if not GROQ_API_KEY:
 if not APIFY_API_TOKEN:
     raise ValueError("APIFY_API_TOKEN is not set in the .env file")
 
-# Create the Groq client
-client = Groq(api_key=GROQ_API_KEY)
+# Create the rate limited Groq client shared with background analysis
+# (process_summary.py uses the same client when run from this process)
+client = get_shared_client(GROQ_API_KEY)
 
 # Create a state variable to track the conversation context
 conversation_context = {}
 use_yaml_for_responses = False  # Flag to determine if YAML-based responses should be used
-yaml_content = ""  # Variable to store the YAML content
+yaml_content = ""  # Variable to store the YAML content (only when it fits in the model context)
+yaml_token_count = 0  # Estimated tokens of the YAML output
+hashtag_index = None  # Hashtag index over the scraped posts
+map_job = None  # Background map-reduce job for datasets too large for the context
 
 # Route for serving the chatbot UI
 @app.route('/')
@@ -37,7 +43,7 @@ def index():
 # API endpoint to handle chat messages
 @app.route('/chat', methods=['POST'])
 def chat():
-    global conversation_context, use_yaml_for_responses, yaml_content
+    global conversation_context, use_yaml_for_responses, yaml_content, yaml_token_count
     try:
         # Get the user message
         data = request.get_json()
@@ -48,23 +54,44 @@ def chat():
 
         # If YAML content is being used, base all interactions on it
         if use_yaml_for_responses:
-            # Use the YAML content to answer questions
+            # Look up hashtags mentioned in the question (e.g. "#footballedit" or "footballedit") in the index
+            hashtag_facts = hashtag_index.describe_hashtags(user_message) if hashtag_index else ""
+            index_results = f"Hashtag index results (computed over the whole dataset):\n{hashtag_facts}"
+
+            if yaml_token_count <= map_reduce.CONTEXT_TOKEN_BUDGET:
+                # Use the YAML content (and any index results) to answer questions
+                system_content = (
+                    "You are Scoutie, an AI assistant that exclusively uses the provided YAML data "
+                    "to answer all questions. Only reference the YAML data below and provide "
+                    "answers to the questions preferably in points, make a new line for a new point, "
+                    "detailed, accurate, and concise responses.\n\n"
+                    f"YAML Data:\n\"\"\"\n{yaml_content}\"\"\""
+                )
+                # Index results only go in if they still fit next to the YAML in the context
+                if hashtag_facts and yaml_token_count + count_tokens(index_results) <= map_reduce.CONTEXT_TOKEN_BUDGET:
+                    system_content += f"\n\n{index_results}"
+            elif hashtag_facts and hashtag_index.find_hashtags(user_message, include_words=False):
+                # The dataset is too large for the context, but a #hashtag question is answered by the index
+                system_content = (
+                    "You are Scoutie, an AI assistant that exclusively uses the provided hashtag index results "
+                    "to answer all questions. They are computed over the whole scraped TikTok dataset. "
+                    "Only reference the results below and provide answers to the questions preferably in points, "
+                    "make a new line for a new point, detailed, accurate, and concise responses.\n\n"
+                    f"{index_results}"
+                )
+            else:
+                # Other questions over a dataset too large for the context are answered with map-reduce
+                assistant_reply = map_reduce.answer_whole_dataset(client, user_message, map_job)
+                return jsonify({'response': assistant_reply})
+
             messages = [
-                {
-                    "role": "system",
-                    "content": (
-                        "You are Scoutie, an AI assistant that exclusively uses the provided YAML data "
-                        "to answer all questions. Only reference the YAML data below and provide "
-                        "answers to the questions preferably in points, make a new line for a new point, "
-                        "detailed, accurate, and concise responses.\n\n"
-                        f"YAML Data:\n\"\"\"\n{yaml_content}\"\"\""
-                    )
-                },
+                {"role": "system", "content": system_content},
                 {"role": "user", "content": user_message}
             ]
 
             # Call the Groq API with the YAML context
-            groq_response = client.chat.completions.create(
+            groq_response = client.chat_completion(
+                priority=INTERACTIVE,
                 model='llama3-8b-8192',
                 messages=messages
             )
@@ -108,7 +135,8 @@ def chat():
         ] + trimmed_history
 
         # Call the Groq API to get the assistant's response
-        groq_response = client.chat.completions.create(
+        groq_response = client.chat_completion(
+            priority=INTERACTIVE,
             model='llama3-8b-8192',
             messages=messages
         )
@@ -145,15 +173,28 @@ def chat():
 # API endpoint to trigger processing via process_summary.py
 @app.route('/process-summary', methods=['POST'])
 def process_summary():
-    global use_yaml_for_responses, yaml_content
+    global use_yaml_for_responses, yaml_content, yaml_token_count, hashtag_index, map_job
     try:
-        # Call the processing script
-        subprocess.call(['python', 'process_summary.py'])
-
-        # Load the generated YAML content
-        yaml_file_path = "output.yaml"
-        with open(yaml_file_path, "r") as yaml_file:
-            yaml_content = yaml_file.read()
+        # Run the processing pipeline in this process so its Groq calls share the rate limiter with chat
+        token_count = summary_pipeline.main()
+        if token_count is None:
+            return jsonify({'response': "No TikTok data was found for this summary. Please try again with different requirements."})
+
+        # Load the generated YAML content only if it fits in a single prompt;
+        # larger datasets are answered from the CSV with map-reduce
+        yaml_token_count = token_count
+        yaml_content = ""
+        map_job = None
+        if yaml_token_count <= map_reduce.CONTEXT_TOKEN_BUDGET:
+            yaml_file_path = "output.yaml"
+            with open(yaml_file_path, "r") as yaml_file:
+                yaml_content = yaml_file.read()
+        else:
+            # Start summarising the dataset in the background for whole-dataset questions
+            map_job = map_reduce.start_map_job(client, "tiktok_results.csv")
+
+        # Load the hashtag index built while saving the CSV
+        hashtag_index = HashtagIndex.load("hashtag_index.npz") if os.path.exists("hashtag_index.npz") else None
 
         # Switch to using YAML for responses
         use_yaml_for_responses = True
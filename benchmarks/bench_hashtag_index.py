@@ -0,0 +1,87 @@
+"""
+Hashtag lookups through HashtagIndex versus scanning the hashtags_post column.
+
+Builds a synthetic dataset of normalized posts (100k by default) and times
+"which creators post #<tag> with high engagement" both ways, for a rare
+hashtag (#footballedit, at the tail of the Zipf vocabulary) and for the most
+common one (#tag0, carried by a large share of all posts).
+
+Usage:
+    python benchmarks/bench_hashtag_index.py [posts]
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from hashtag_index import HashtagIndex, ENGAGEMENT_METRICS
+
+REPEATS = 20
+
+
+def synthetic_posts(size, seed=0):
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f"tag{i}" for i in range(5000)] + ["footballedit", "football", "fyp"])
+    # Skewed popularity so a few hashtags are very common, like on TikTok
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    weights /= weights.sum()
+    hashtags = [
+        ", ".join(rng.choice(vocabulary, size=rng.integers(1, 8), replace=False, p=weights))
+        for _ in range(size)
+    ]
+    creators = rng.integers(0, size // 20 + 1, size=size)
+    return pd.DataFrame({
+        "post_id": np.arange(size).astype(str),
+        "user_id": creators.astype(str),
+        "user_profileurl": [f"https://www.tiktok.com/@creator{c}" for c in creators],
+        "playCount": rng.integers(100, 10_000_000, size=size),
+        "diggCount": rng.integers(0, 1_000_000, size=size),
+        "commentCount": rng.integers(0, 50_000, size=size),
+        "shareCount": rng.integers(0, 100_000, size=size),
+        "collectCount": rng.integers(0, 50_000, size=size),
+        "hashtags_post": hashtags,
+    })
+
+
+def scan_top_creators(df, tag, limit=10):
+    mask = df["hashtags_post"].str.split(", ").apply(lambda tags: tag in tags)
+    matches = df[mask]
+    engagement = matches[ENGAGEMENT_METRICS].sum(axis=1).groupby(matches["user_id"]).sum()
+    return engagement.sort_values(ascending=False).head(limit)
+
+
+def timed(function):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        result = function()
+    return (time.perf_counter() - start) / REPEATS * 1000, result
+
+
+def main(size):
+    df = synthetic_posts(size)
+
+    start = time.perf_counter()
+    index = HashtagIndex()
+    for chunk_start in range(0, size, 1000):
+        index.add_posts(df.iloc[chunk_start:chunk_start + 1000])
+    index.top_creators("footballedit")
+    build_seconds = time.perf_counter() - start
+
+    print(f"posts: {size}, hashtags: {len(index.tags)}")
+    print(f"index build (1000-post chunks): {build_seconds:.2f} s")
+    for tag in ("footballedit", "tag0"):
+        scan_ms, scanned = timed(lambda: scan_top_creators(df, tag))
+        index_ms, indexed = timed(lambda: index.top_creators(tag))
+        related_ms, _ = timed(lambda: index.related_hashtags(tag))
+        assert list(scanned.index) == [creator["creator_id"] for creator in indexed]
+
+        print(f"\n#{tag}: {len(index.posts_for(tag))} posts")
+        print(f"  top creators, column scan:  {scan_ms:8.2f} ms")
+        print(f"  top creators, index lookup: {index_ms:8.2f} ms")
+        print(f"  related hashtags (co-occurrence, after first build): {related_ms:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
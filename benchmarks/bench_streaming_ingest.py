@@ -0,0 +1,103 @@
+"""
+Peak memory of streaming dataset ingestion versus dataset size.
+
+Each size runs in a fresh interpreter so ru_maxrss reflects only that run.
+Both modes run the pipeline of process_summary.main() after the scrape:
+"stream" writes the CSV page by page and converts it to YAML chunk by chunk,
+"list" loads the whole dataset and dumps the whole CSV as one YAML string, as
+before. The streaming peak RSS should stay roughly flat as the dataset grows,
+while the list path grows linearly.
+
+Usage:
+    python benchmarks/bench_streaming_ingest.py [size ...]
+"""
+import os
+import sys
+import time
+import resource
+import tempfile
+import subprocess
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_SIZES = [1000, 10000, 50000, 100000]
+
+
+class SyntheticDataset:
+    """Stands in for apify_client.dataset(...) and generates items on demand."""
+
+    def __init__(self, size):
+        self.size = size
+
+    def _item(self, index):
+        return {
+            "id": str(7437770093544754448 + index),
+            "text": f"Post {index} #football #footballedit #fyp #skills",
+            "webVideoUrl": f"https://www.tiktok.com/@creator{index % 500}/video/{index}",
+            "diggCount": index * 3,
+            "shareCount": index % 97,
+            "playCount": index * 20,
+            "collectCount": index % 31,
+            "commentCount": index % 53,
+            "searchQuery": "football",
+            "authorMeta": {
+                "id": str(6826196408950146053 + index % 500),
+                "profileUrl": f"https://www.tiktok.com/@creator{index % 500}",
+                "signature": "Football edits every day",
+                "bioLink": None,
+                "fans": 12200 + index,
+                "heart": 847000,
+                "video": 27,
+                "digg": 127,
+            },
+            "videoMeta": {"coverUrl": f"https://p16-sign-sg.tiktokcdn.com/obj/{index}"},
+            "hashtags": [{"name": "football"}, {"name": "footballedit"}, {"name": "fyp"}],
+        }
+
+    def list_items(self, offset=0, limit=None):
+        end = self.size if limit is None else min(self.size, offset + limit)
+        return SimpleNamespace(items=[self._item(i) for i in range(offset, end)], total=self.size)
+
+
+def run_child(size, mode):
+    # process_summary checks for API keys at import time
+    os.environ.setdefault("GROQ_API_KEY", "benchmark")
+    os.environ.setdefault("APIFY_API_TOKEN", "benchmark")
+    sys.path.insert(0, ROOT)
+    import process_summary
+
+    dataset = SyntheticDataset(size)
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "tiktok_results.csv")
+        start = time.perf_counter()
+        if mode == "stream":
+            process_summary.stream_dataset_to_file(dataset, filename)
+            process_summary.csv_to_yaml_and_count_tokens(filename, os.path.join(tmp, "output.yaml"))
+        else:
+            process_summary.save_to_csv(dataset.list_items().items, filename)
+            # The YAML conversion as it was before streaming: whole CSV in one string
+            records = process_summary.pd.read_csv(filename).to_dict(orient='records')
+            with open(os.path.join(tmp, "output.yaml"), "w") as yaml_file:
+                yaml_file.write(process_summary.yaml.dump(records, default_flow_style=False, sort_keys=False))
+        elapsed = time.perf_counter() - start
+
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{elapsed:.2f} {peak_rss_mb:.1f}")
+
+
+def main(sizes):
+    print(f"{'items':>8} {'mode':>7} {'seconds':>8} {'peak RSS (MB)':>14}")
+    for size in sizes:
+        for mode in ("stream", "list"):
+            output = subprocess.run(
+                [sys.executable, __file__, "--child", str(size), mode],
+                check=True, capture_output=True, text=True,
+            ).stdout.split()
+            print(f"{size:>8} {mode:>7} {output[-2]:>8} {output[-1]:>14}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run_child(int(sys.argv[2]), sys.argv[3])
+    else:
+        main([int(size) for size in sys.argv[1:]] or DEFAULT_SIZES)
@@ -0,0 +1,308 @@
+import os
+import re
+import time
+import heapq
+import itertools
+import threading
+from groq import Groq, RateLimitError, APIConnectionError, InternalServerError
+
+# Priority classes: lower values are always served first
+INTERACTIVE = 0
+BATCH = 1
+
+# Default quota for llama3-8b-8192 on the Groq free tier (overridable via .env)
+DEFAULT_REQUESTS_PER_MINUTE = 30
+DEFAULT_TOKENS_PER_MINUTE = 30000
+
+# Completion budget assumed when the caller does not pass max_tokens
+DEFAULT_COMPLETION_TOKENS = 512
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_reset_duration(value):
+    """
+    Parse a Groq rate limit reset header into seconds.
+    Args:
+        value: Header value such as "7.66s", "2m59.56s", "1h2m3s" or "250ms"
+    Returns:
+        The duration in seconds, or None if the value cannot be parsed
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    multipliers = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+    return sum(float(amount) * multipliers[unit] for amount, unit in parts)
+
+
+def count_tokens(text):
+    """Rough token count for llama3 prompts (~4 characters per token)."""
+    return len(str(text)) // 4 + 1
+
+
+def estimate_tokens(messages, max_tokens=None):
+    """
+    Roughly estimate the tokens a chat completion will consume.
+    Args:
+        messages: The chat messages sent to the model
+        max_tokens: The completion budget requested by the caller, if any
+    Returns:
+        The estimated prompt plus completion token count
+    """
+    # Content tokens plus a small per-message overhead
+    prompt_tokens = sum(count_tokens(message.get("content", "")) + 4 for message in messages)
+    completion_tokens = max_tokens if max_tokens else DEFAULT_COMPLETION_TOKENS
+    return prompt_tokens + completion_tokens
+
+
+def is_transient_error(error):
+    """
+    Whether a failed Groq call is worth retrying later: rate limits, timeouts,
+    connection problems and server errors. Authentication and bad requests are not.
+    """
+    return isinstance(error, (RateLimitError, APIConnectionError, InternalServerError))
+
+
+class TokenBucket:
+    def __init__(self, capacity, refill_per_second):
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated = now
+
+    def wait_time(self, amount, reserve, now):
+        """
+        Seconds until `amount` can be taken while still leaving `reserve` in the bucket.
+        Without a reserve, requests larger than the bucket only wait for a full
+        bucket; with one, the caller must ensure amount + reserve fits the bucket.
+        """
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        needed = amount + reserve if reserve else min(amount, self.capacity)
+        deficit = needed - self.tokens
+        if deficit <= 0:
+            return 0.0
+        return deficit / self.refill_per_second
+
+    def take(self, amount):
+        # Allowed to go negative when reconciling an underestimate
+        self.tokens -= amount
+
+    def give(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def observe(self, remaining, reset_seconds, now):
+        """Clamp the local estimate to the remaining quota reported by the server."""
+        self._refill(now)
+        if remaining is None:
+            return
+        self.tokens = min(self.tokens, float(remaining))
+        if remaining <= 0 and reset_seconds:
+            self.blocked_until = max(self.blocked_until, now + reset_seconds)
+
+    def block_for(self, seconds, now):
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+class RateLimitedGroq:
+    """
+    Groq client wrapper shared by chat, keyword generation and batch analysis.
+
+    Every call waits for a request and a token budget (token buckets refilled per
+    minute and corrected from the x-ratelimit-* response headers), and for a
+    concurrency slot sized by AIMD: the limit grows by one per window of
+    successful calls and halves on every 429. Waiters are served strictly by
+    priority, so a queued INTERACTIVE call always goes before any BATCH call,
+    and BATCH calls can never drain the last `batch_reserve` of either budget
+    or the last concurrency slot (INTERACTIVE may exceed a limit of 1 by one).
+    A BATCH call larger than max_batch_tokens is rejected with ValueError.
+
+    Coordination is per process: use get_shared_client() so every caller in
+    the process shares one queue and one set of buckets.
+    """
+
+    def __init__(self, client, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, initial_concurrency=2,
+                 max_concurrency=8, batch_reserve=0.2, max_retries=3):
+        self.client = client
+        self.request_bucket = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.token_bucket = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self.concurrency_limit = float(initial_concurrency)
+        self.max_concurrency = max_concurrency
+        self.batch_reserve = batch_reserve
+        self.max_retries = max_retries
+
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (priority, sequence) tickets
+        self._sequence = itertools.count()
+        self._in_flight = 0
+
+    def chat_completion(self, priority=INTERACTIVE, **kwargs):
+        """
+        Rate limited equivalent of client.chat.completions.create(**kwargs).
+        Args:
+            priority: INTERACTIVE for user-facing calls, BATCH for background work
+            kwargs: Arguments passed through to the Groq chat completions API
+        Returns:
+            The parsed chat completion
+        """
+        estimate = estimate_tokens(kwargs.get("messages", []), kwargs.get("max_tokens"))
+        if priority != INTERACTIVE and estimate > self.max_batch_tokens:
+            # It could only ever be admitted by draining the interactive reserve
+            raise ValueError(
+                f"Background call estimated at {estimate} tokens exceeds the {self.max_batch_tokens} "
+                "tokens per minute available to background calls"
+            )
+
+        for attempt in range(self.max_retries + 1):
+            self._acquire(priority, estimate)
+            try:
+                raw_response = self.client.chat.completions.with_raw_response.create(**kwargs)
+                completion = raw_response.parse()
+            except RateLimitError as e:
+                headers = e.response.headers if e.response is not None else {}
+                self._release(estimate, None, headers, throttled=True, attempt=attempt)
+                if attempt == self.max_retries:
+                    raise
+                continue
+            except Exception:
+                self._release(estimate, None, None, throttled=False)
+                raise
+
+            usage = getattr(completion, "usage", None)
+            used_tokens = getattr(usage, "total_tokens", None)
+            self._release(estimate, used_tokens, raw_response.headers, throttled=False)
+            return completion
+
+    @property
+    def max_batch_tokens(self):
+        """Largest token estimate a BATCH call may have: the per-minute budget minus the reserve."""
+        if self.request_bucket.capacity * (1 - self.batch_reserve) < 1:
+            # Not even one BATCH request fits next to the request reserve
+            return 0
+        return int(self.token_bucket.capacity * (1 - self.batch_reserve))
+
+    def _slots_for(self, priority):
+        limit = int(self.concurrency_limit)
+        # BATCH always leaves one slot for interactive calls; when the limit has
+        # dropped to 1 that means INTERACTIVE may go one over it
+        batch_slots = max(1, limit - 1)
+        if priority == INTERACTIVE:
+            return max(limit, batch_slots + 1)
+        return batch_slots
+
+    def _admission_delay(self, ticket, estimate, now):
+        """
+        Returns 0 when the ticket may proceed, a number of seconds to wait for the
+        buckets to refill, or None to wait until another call finishes.
+        """
+        if self._waiting[0] != ticket:
+            return None
+        priority = ticket[0]
+        if self._in_flight >= self._slots_for(priority):
+            return None
+
+        reserve = self.batch_reserve if priority != INTERACTIVE else 0.0
+        return max(
+            self.request_bucket.wait_time(1, reserve * self.request_bucket.capacity, now),
+            self.token_bucket.wait_time(estimate, reserve * self.token_bucket.capacity, now),
+        )
+
+    def _acquire(self, priority, estimate):
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    delay = self._admission_delay(ticket, estimate, time.monotonic())
+                    if delay == 0:
+                        break
+                    self._cond.wait(timeout=delay)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+            self._in_flight += 1
+            self.request_bucket.take(1)
+            self.token_bucket.take(estimate)
+
+    def _release(self, estimate, used_tokens, headers, throttled, attempt=0):
+        with self._cond:
+            now = time.monotonic()
+            self._in_flight -= 1
+
+            # Replace the estimate with the real usage once it is known
+            if used_tokens is not None:
+                self.token_bucket.give(estimate - used_tokens)
+            elif throttled:
+                self.request_bucket.give(1)
+                self.token_bucket.give(estimate)
+
+            if headers:
+                self._observe_headers(headers, now)
+
+            if throttled:
+                retry_after = parse_reset_duration(headers.get("retry-after")) if headers else None
+                if retry_after is None:
+                    retry_after = 2 ** attempt
+                self.request_bucket.block_for(retry_after, now)
+                self.token_bucket.block_for(retry_after, now)
+                self.concurrency_limit = max(1.0, self.concurrency_limit / 2)
+            elif used_tokens is not None:
+                self.concurrency_limit = min(
+                    float(self.max_concurrency),
+                    self.concurrency_limit + 1.0 / self.concurrency_limit,
+                )
+
+            self._cond.notify_all()
+
+    def _observe_headers(self, headers, now):
+        # Groq reports requests per day and tokens per minute, so the request
+        # headers only matter once the daily quota is exhausted
+        for bucket, kind in ((self.request_bucket, "requests"), (self.token_bucket, "tokens")):
+            remaining = headers.get(f"x-ratelimit-remaining-{kind}")
+            if remaining is None:
+                continue
+            try:
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            reset_seconds = parse_reset_duration(headers.get(f"x-ratelimit-reset-{kind}"))
+            bucket.observe(remaining, reset_seconds, now)
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def get_shared_client(api_key=None):
+    """
+    Return the process-wide rate limited Groq client, creating it on first use.
+    Quota defaults can be overridden with GROQ_REQUESTS_PER_MINUTE and
+    GROQ_TOKENS_PER_MINUTE in the .env file.
+    """
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = RateLimitedGroq(
+                Groq(api_key=api_key or os.getenv("GROQ_API_KEY")),
+                requests_per_minute=int(os.getenv("GROQ_REQUESTS_PER_MINUTE", DEFAULT_REQUESTS_PER_MINUTE)),
+                tokens_per_minute=int(os.getenv("GROQ_TOKENS_PER_MINUTE", DEFAULT_TOKENS_PER_MINUTE)),
+            )
+        return _shared_client
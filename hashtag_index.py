@@ -0,0 +1,336 @@
+import re
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Engagement columns aggregated per hashtag and per creator
+METRICS = ['playCount', 'diggCount', 'commentCount', 'shareCount', 'collectCount']
+
+# Interactions counted as engagement (everything except views)
+ENGAGEMENT_METRICS = ['diggCount', 'commentCount', 'shareCount', 'collectCount']
+
+_HASHTAG_PATTERN = re.compile(r"#(\w+)")
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def normalize_tag(tag):
+    """Normalize a hashtag for lookups: lowercase without the leading '#'."""
+    return str(tag).strip().lstrip('#').lower()
+
+
+class HashtagIndex:
+    """
+    Inverted index from hashtag to posts and creators, backed by a sparse
+    post x hashtag matrix. Lookups only touch the posts carrying the hashtag,
+    and co-occurrence / per-hashtag engagement are computed with sparse
+    matrix products instead of scanning the hashtags_post strings.
+
+    Build it chunk by chunk with add_posts() while normalizing (see
+    process_summary.stream_dataset_to_file), or from an existing CSV with
+    from_csv(), then save() / load() it as a .npz file.
+    """
+
+    def __init__(self):
+        self.tags = []
+        self.tag_codes = {}
+        self.post_ids = []
+        self.creator_ids = []
+        self.creator_urls = []
+        self.creator_codes = {}
+
+        # Chunks collected by add_posts(), merged by _finalize()
+        self._post_creators = []
+        self._metrics = []
+        self._rows = []
+        self._cols = []
+
+        self.matrix = None
+        self._by_tag = None
+        self._cooccurrence = None
+
+    def add_posts(self, df):
+        """
+        Add a chunk of normalized posts (the DataFrame written to the CSV).
+        Args:
+            df: DataFrame with post_id, user_id, user_profileurl, hashtags_post and the METRICS columns
+        """
+        if df.empty:
+            return
+        df = df.reset_index(drop=True)
+        offset = len(self.post_ids)
+        self.post_ids.extend(df['post_id'].astype(str))
+
+        # Map creators to integer codes
+        user_ids = df['user_id'].astype(str) if 'user_id' in df.columns else pd.Series([''] * len(df))
+        urls = df['user_profileurl'].astype(str) if 'user_profileurl' in df.columns else pd.Series([''] * len(df))
+        codes = np.empty(len(df), dtype=np.int64)
+        for position, (user_id, url) in enumerate(zip(user_ids, urls)):
+            code = self.creator_codes.get(user_id)
+            if code is None:
+                code = self.creator_codes[user_id] = len(self.creator_ids)
+                self.creator_ids.append(user_id)
+                self.creator_urls.append(url)
+            codes[position] = code
+        self._post_creators.append(codes)
+
+        metrics = np.zeros((len(df), len(METRICS)))
+        for column, metric in enumerate(METRICS):
+            if metric in df.columns:
+                metrics[:, column] = pd.to_numeric(df[metric], errors='coerce').fillna(0).to_numpy()
+        self._metrics.append(metrics)
+
+        # One (post, hashtag) pair per hashtag occurrence
+        if 'hashtags_post' in df.columns:
+            tags = df['hashtags_post'].fillna('').astype(str).str.split(',').explode()
+            tags = tags.map(normalize_tag)
+            tags = tags[tags != '']
+            for tag in tags.unique():
+                if tag not in self.tag_codes:
+                    self.tag_codes[tag] = len(self.tags)
+                    self.tags.append(tag)
+            self._rows.append(tags.index.to_numpy() + offset)
+            self._cols.append(tags.map(self.tag_codes).to_numpy())
+
+        self.matrix = None
+
+    def _finalize(self):
+        if self.matrix is not None:
+            return
+        rows = np.concatenate(self._rows) if self._rows else np.empty(0, dtype=np.int64)
+        cols = np.concatenate(self._cols) if self._cols else np.empty(0, dtype=np.int64)
+        matrix = sparse.coo_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=(len(self.post_ids), len(self.tags))
+        ).tocsr()
+        # A hashtag repeated in one post still counts once
+        matrix.data[:] = 1.0
+        self._set_matrix(matrix)
+
+        self._rows = [rows]
+        self._cols = [cols]
+        self._post_creators = [self.post_creators]
+        self._metrics = [self.metrics]
+
+    def _set_matrix(self, matrix):
+        self.matrix = matrix
+        self._by_tag = matrix.tocsc()
+        self._cooccurrence = None
+        self.post_creators = (
+            np.concatenate(self._post_creators) if self._post_creators else np.empty(0, dtype=np.int64)
+        )
+        self.metrics = np.vstack(self._metrics) if self._metrics else np.zeros((0, len(METRICS)))
+
+        # Per-hashtag aggregates: post counts and summed metrics
+        self.tag_post_counts = np.asarray(matrix.sum(axis=0)).ravel()
+        self.tag_metric_totals = np.asarray(matrix.T @ self.metrics)
+
+    @property
+    def cooccurrence(self):
+        """Hashtag x hashtag matrix counting the posts that carry both hashtags."""
+        self._finalize()
+        if self._cooccurrence is None:
+            self._cooccurrence = (self.matrix.T @ self.matrix).tocsr()
+        return self._cooccurrence
+
+    def _post_rows(self, tag):
+        self._finalize()
+        code = self.tag_codes.get(normalize_tag(tag))
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        start, end = self._by_tag.indptr[code], self._by_tag.indptr[code + 1]
+        return self._by_tag.indices[start:end]
+
+    def posts_for(self, tag):
+        """Return the ids of the posts carrying the hashtag."""
+        return [self.post_ids[row] for row in self._post_rows(tag)]
+
+    def creators_for(self, tag):
+        """Return the ids of the creators who posted with the hashtag."""
+        codes = np.unique(self.post_creators[self._post_rows(tag)])
+        return [self.creator_ids[code] for code in codes]
+
+    def top_creators(self, tag, limit=10, sort_by='engagement'):
+        """
+        Rank the creators posting with a hashtag by their engagement on those posts.
+        Args:
+            tag: The hashtag, with or without '#'
+            limit: Maximum number of creators returned
+            sort_by: 'engagement', 'engagement_rate' or one of METRICS
+        Returns:
+            List of dicts with creator_id, profile_url, posts and the aggregated metrics
+        """
+        rows = self._post_rows(tag)
+        if len(rows) == 0:
+            return []
+
+        codes, creator_positions = np.unique(self.post_creators[rows], return_inverse=True)
+        metrics = self.metrics[rows]
+        totals = np.zeros((len(codes), len(METRICS)))
+        np.add.at(totals, creator_positions, metrics)
+        posts = np.bincount(creator_positions, minlength=len(codes))
+
+        engagement = totals[:, [METRICS.index(metric) for metric in ENGAGEMENT_METRICS]].sum(axis=1)
+        plays = totals[:, METRICS.index('playCount')]
+        engagement_rate = np.divide(engagement, plays, out=np.zeros_like(engagement), where=plays > 0)
+
+        if sort_by == 'engagement':
+            scores = engagement
+        elif sort_by == 'engagement_rate':
+            scores = engagement_rate
+        else:
+            scores = totals[:, METRICS.index(sort_by)]
+
+        ranking = np.argsort(-scores, kind='stable')[:limit]
+        results = []
+        for position in ranking:
+            code = codes[position]
+            result = {
+                'creator_id': self.creator_ids[code],
+                'profile_url': self.creator_urls[code],
+                'posts': int(posts[position]),
+                'engagement': int(engagement[position]),
+                'engagement_rate': round(float(engagement_rate[position]), 4),
+            }
+            for column, metric in enumerate(METRICS):
+                result[metric] = int(totals[position, column])
+            results.append(result)
+        return results
+
+    def hashtag_stats(self, tag):
+        """Return post/creator counts and engagement totals for a hashtag, or None if unknown."""
+        self._finalize()
+        code = self.tag_codes.get(normalize_tag(tag))
+        if code is None:
+            return None
+        stats = {
+            'hashtag': self.tags[code],
+            'posts': int(self.tag_post_counts[code]),
+            'creators': len(np.unique(self.post_creators[self._post_rows(tag)])),
+        }
+        for column, metric in enumerate(METRICS):
+            stats[metric] = int(self.tag_metric_totals[code, column])
+        return stats
+
+    def related_hashtags(self, tag, limit=10):
+        """
+        Return the hashtags most often used together with the given one.
+        Returns:
+            List of (hashtag, number of posts carrying both) pairs
+        """
+        code = self.tag_codes.get(normalize_tag(tag))
+        if code is None:
+            return []
+        cooccurrence = self.cooccurrence
+        start, end = cooccurrence.indptr[code], cooccurrence.indptr[code + 1]
+        cols = cooccurrence.indices[start:end]
+        counts = cooccurrence.data[start:end]
+        others = cols != code
+        cols, counts = cols[others], counts[others]
+
+        # Most shared posts first; ties keep the order in which hashtags were first seen
+        order = np.lexsort((cols, -counts))[:limit]
+        return [(self.tags[cols[position]], int(counts[position])) for position in order]
+
+    def expand_keywords(self, keywords, per_keyword=2):
+        """
+        Add the most related hashtags of every keyword that is a known hashtag,
+        to widen the next scrape.
+        Args:
+            keywords: Keywords produced by generate_keywords
+            per_keyword: Maximum hashtags added per keyword
+        Returns:
+            The keywords followed by the new hashtags, without duplicates
+        """
+        expanded = list(keywords)
+        seen = {normalize_tag(keyword) for keyword in keywords}
+        for keyword in keywords:
+            for tag, _ in self.related_hashtags(keyword, limit=per_keyword):
+                if tag not in seen:
+                    seen.add(tag)
+                    expanded.append(tag)
+        return expanded
+
+    def find_hashtags(self, message, include_words=True, limit=3):
+        """
+        Return the known hashtags mentioned in a chat message: explicit "#tags"
+        first, then (with include_words) plain words that are hashtags in the index.
+        """
+        candidates = [normalize_tag(tag) for tag in _HASHTAG_PATTERN.findall(message)]
+        if include_words:
+            candidates += [normalize_tag(word) for word in _WORD_PATTERN.findall(message)]
+        return [tag for tag in dict.fromkeys(candidates) if tag in self.tag_codes][:limit]
+
+    def describe_hashtags(self, message, limit=5):
+        """
+        Build a plain-text summary of the index entries for the hashtags
+        mentioned in a chat message (e.g. "#footballedit" or "footballedit").
+        Returns:
+            The summary text, or an empty string if no known hashtag is mentioned
+        """
+        lines = []
+        for tag in self.find_hashtags(message):
+            stats = self.hashtag_stats(tag)
+            lines.append(
+                f"#{tag}: {stats['posts']} posts by {stats['creators']} creators, "
+                f"{stats['playCount']} views, {stats['diggCount']} likes, "
+                f"{stats['commentCount']} comments, {stats['shareCount']} shares"
+            )
+            lines.append(f"Top creators for #{tag} by engagement:")
+            for creator in self.top_creators(tag, limit=limit):
+                lines.append(
+                    f"- {creator['profile_url'] or creator['creator_id']}: {creator['posts']} posts, "
+                    f"{creator['playCount']} views, {creator['engagement']} engagements "
+                    f"(rate {creator['engagement_rate']:.2%})"
+                )
+            related = self.related_hashtags(tag, limit=limit)
+            if related:
+                lines.append(
+                    f"Hashtags used with #{tag}: " + ", ".join(f"#{other} ({count})" for other, count in related)
+                )
+        return "\n".join(lines)
+
+    def save(self, path):
+        """Save the index to a .npz file."""
+        self._finalize()
+        np.savez_compressed(
+            path,
+            tags=np.array(self.tags, dtype=str),
+            post_ids=np.array(self.post_ids, dtype=str),
+            creator_ids=np.array(self.creator_ids, dtype=str),
+            creator_urls=np.array(self.creator_urls, dtype=str),
+            post_creators=self.post_creators,
+            metrics=self.metrics,
+            indptr=self.matrix.indptr,
+            indices=self.matrix.indices,
+        )
+
+    @classmethod
+    def load(cls, path):
+        """Load an index saved with save()."""
+        index = cls()
+        with np.load(path, allow_pickle=False) as data:
+            index.tags = data['tags'].tolist()
+            index.post_ids = data['post_ids'].tolist()
+            index.creator_ids = data['creator_ids'].tolist()
+            index.creator_urls = data['creator_urls'].tolist()
+            index._post_creators = [data['post_creators']]
+            index._metrics = [data['metrics']]
+            indptr, indices = data['indptr'], data['indices']
+
+        index.tag_codes = {tag: code for code, tag in enumerate(index.tags)}
+        index.creator_codes = {creator_id: code for code, creator_id in enumerate(index.creator_ids)}
+        matrix = sparse.csr_matrix(
+            (np.ones(len(indices)), indices, indptr), shape=(len(index.post_ids), len(index.tags))
+        )
+        index._set_matrix(matrix)
+        coo = matrix.tocoo()
+        index._rows = [coo.row.astype(np.int64)]
+        index._cols = [coo.col.astype(np.int64)]
+        return index
+
+    @classmethod
+    def from_csv(cls, csv_file, chunksize=10000):
+        """Build an index from a CSV written by process_summary.py, reading it in chunks."""
+        index = cls()
+        for df in pd.read_csv(csv_file, chunksize=chunksize, dtype={'post_id': str, 'user_id': str}):
+            index.add_posts(df)
+        return index
@@ -0,0 +1,359 @@
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+import pandas as pd
+import yaml
+from groq_limiter import count_tokens, estimate_tokens, is_transient_error, INTERACTIVE, BATCH
+
+MODEL = 'llama3-8b-8192'
+MODEL_CONTEXT_TOKENS = 8192
+
+# Largest YAML dataset answered in a single prompt: the window minus the system prompt and the reply
+PROMPT_OVERHEAD_TOKENS = 300
+REPLY_TOKENS = 1024
+CONTEXT_TOKEN_BUDGET = MODEL_CONTEXT_TOKENS - PROMPT_OVERHEAD_TOKENS - REPLY_TOKENS
+
+# Data tokens per map/reduce call, leaving room for the map/reduce prompt and reply
+# (map chunks shrink further when the quota is smaller, see chunk_token_budget)
+CHUNK_TOKEN_BUDGET = 5000
+MAP_MAX_TOKENS = 512
+REDUCE_MAX_TOKENS = 768
+
+# Maximum number of map/reduce calls (and so map chunks held in memory) in flight
+MAP_CONCURRENCY = 4
+
+# Runs of a map job before a transient error (rate limit, timeout) is reported to the user
+MAX_MAP_ATTEMPTS = 3
+
+# Directory holding per-dataset map outputs (one JSON line per chunk summary)
+CACHE_DIR = "map_cache"
+
+MAP_PROMPT = (
+    "You are analysing one part of a TikTok dataset scraped for influencer discovery. "
+    "Summarise this part so it can later be combined with summaries of the other parts. "
+    "Cover the creators (username, profile URL, followers), the main themes and hashtags, "
+    "and notable engagement figures (views, likes, comments, shares). "
+    "Keep names and numbers exact and only use the data below."
+)
+
+REDUCE_PROMPT = (
+    "Below are summaries of different parts of one TikTok dataset. "
+    "Merge them into a single summary that keeps every detail relevant to this question: {question}\n"
+    "Keep creator names and numbers exact and do not add information that is not in the summaries."
+)
+
+ANSWER_PROMPT = (
+    "You are Scoutie, an AI assistant that exclusively uses the provided summaries of a TikTok dataset "
+    "to answer all questions. The summaries together cover the whole dataset. Only reference them and "
+    "provide answers to the questions preferably in points, make a new line for a new point, "
+    "detailed, accurate, and concise responses."
+)
+
+_cache_lock = threading.Lock()
+
+# Background map jobs by dataset fingerprint
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+def fingerprint_file(path):
+    """
+    Compute a fingerprint of a dataset file so cached map outputs can be reused.
+    Args:
+        path: The CSV file holding the scraped rows
+    Returns:
+        The SHA-256 hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def iter_row_texts(csv_file):
+    """Yield each scraped row rendered as YAML, the same format used for yaml_content."""
+    for df in pd.read_csv(csv_file, chunksize=1000):
+        for record in df.to_dict(orient='records'):
+            yield yaml.dump([record], default_flow_style=False, sort_keys=False)
+
+
+def pack_texts(texts, token_budget=CHUNK_TOKEN_BUDGET):
+    """
+    Greedily pack texts into chunks that each stay within the token budget.
+    A single text larger than the budget becomes a chunk of its own.
+    Args:
+        texts: Iterable of strings, in order
+        token_budget: Maximum estimated tokens per chunk
+    Yields:
+        Chunk strings, in order
+    """
+    current = []
+    current_tokens = 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and current_tokens + tokens > token_budget:
+            yield "".join(current)
+            current = []
+            current_tokens = 0
+        current.append(text)
+        current_tokens += tokens
+    if current:
+        yield "".join(current)
+
+
+def chunk_token_budget(client):
+    """
+    Data tokens per map chunk, so a whole map call fits in the quota left to
+    BATCH calls without touching the interactive reserve.
+    Args:
+        client: The rate limited Groq client
+    Returns:
+        The chunk token budget for pack_texts
+    """
+    overhead = estimate_tokens([{"content": MAP_PROMPT}, {"content": ""}], MAP_MAX_TOKENS)
+    return min(CHUNK_TOKEN_BUDGET, client.max_batch_tokens - overhead)
+
+
+def _complete(client, priority, system_prompt, content, max_tokens):
+    response = client.chat_completion(
+        priority=priority,
+        model=MODEL,
+        max_tokens=max_tokens,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": content}
+        ]
+    )
+    return response.choices[0].message.content.strip()
+
+
+def _cache_path(cache_key):
+    return os.path.join(CACHE_DIR, f"{cache_key}.jsonl")
+
+
+def _load_cache(cache_key):
+    cached = {}
+    try:
+        with open(_cache_path(cache_key), "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Partial line left by an interrupted write
+                    continue
+                cached[entry["index"]] = entry["summary"]
+    except OSError:
+        pass
+    return cached
+
+
+def _append_cache(cache_key, index, summary):
+    with _cache_lock:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(_cache_path(cache_key), "a") as f:
+            f.write(json.dumps({"index": str(index), "summary": summary}) + "\n")
+
+
+def map_chunks(client, chunks, cache_key, on_progress=None):
+    """
+    Summarise every chunk concurrently, reusing outputs cached for this dataset.
+    The map prompt does not depend on the question, so follow-up questions
+    over the same dataset skip this step entirely. Chunks are consumed lazily
+    with at most MAP_CONCURRENCY calls in flight, so only those chunks are held
+    in memory. Each summary is cached as soon as it arrives, so a failed chunk
+    does not discard the finished ones; after a failure no new calls are started.
+    Args:
+        client: The rate limited Groq client
+        chunks: Iterable of chunk strings, e.g. produced by pack_texts
+        cache_key: Identifies the dataset and chunking (fingerprint and chunk budget)
+        on_progress: Optional callback called with the number of summarised chunks
+    Returns:
+        List of chunk summaries, in chunk order
+    """
+    cached = _load_cache(cache_key)
+    pending = {}
+    chunk_count = 0
+    done = 0
+    first_error = None
+
+    def collect(futures):
+        nonlocal done, first_error
+        for future in futures:
+            index = pending.pop(future)
+            try:
+                summary = future.result()
+            except Exception as e:
+                if first_error is None:
+                    first_error = e
+                continue
+            _append_cache(cache_key, index, summary)
+            cached[str(index)] = summary
+            done += 1
+            if on_progress:
+                on_progress(done)
+
+    with ThreadPoolExecutor(max_workers=MAP_CONCURRENCY) as executor:
+        for index, chunk in enumerate(chunks):
+            chunk_count = index + 1
+            if str(index) in cached:
+                done += 1
+                if on_progress:
+                    on_progress(done)
+                continue
+            if len(pending) >= MAP_CONCURRENCY:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            if first_error is not None:
+                break
+            pending[executor.submit(_complete, client, BATCH, MAP_PROMPT, chunk, MAP_MAX_TOKENS)] = index
+        collect(as_completed(list(pending)))
+
+    if first_error is not None:
+        raise first_error
+    return [cached[str(index)] for index in range(chunk_count)]
+
+
+class MapJob:
+    """
+    Runs the map step for one dataset in a background thread so /chat never
+    waits for it; the chat layer reports its progress instead. A run that
+    failed with a transient error is retried (see retry_map_job) until
+    MAX_MAP_ATTEMPTS runs have been made; any other error is final.
+    """
+
+    def __init__(self, client, csv_file, fingerprint):
+        self.client = client
+        self.csv_file = csv_file
+        self.fingerprint = fingerprint
+        self.attempts = 0
+        self.previous_error = None
+        self.total = None
+        self.done = 0
+        self.summaries = None
+        self.error = None
+        self._thread = None
+
+    def start(self):
+        self.attempts += 1
+        self.previous_error, self.error = self.error, None
+        self.done = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def running(self):
+        return self.summaries is None and self.error is None
+
+    @property
+    def can_retry(self):
+        return self.error is not None and is_transient_error(self.error) and self.attempts < MAX_MAP_ATTEMPTS
+
+    def _progress(self, done):
+        self.done = done
+
+    def _chunks(self, token_budget):
+        return pack_texts(iter_row_texts(self.csv_file), token_budget)
+
+    def _run(self):
+        try:
+            token_budget = chunk_token_budget(self.client)
+            if self.total is None:
+                # Count the chunks up front (without keeping them) so progress has a total
+                self.total = sum(1 for _ in self._chunks(token_budget))
+            cache_key = f"{self.fingerprint}-{token_budget}"
+            self.summaries = map_chunks(self.client, self._chunks(token_budget), cache_key, self._progress)
+        except Exception as e:
+            print(f"Error while summarising the dataset: {e}")
+            self.error = e
+
+
+def start_map_job(client, csv_file="tiktok_results.csv"):
+    """
+    Start the background map job for a dataset, or return the existing job for
+    the same data. Call it once per scrape and keep the returned job: the
+    dataset is fingerprinted here, not on every question.
+    Args:
+        client: The rate limited Groq client
+        csv_file: The CSV file produced by process_summary.py
+    Returns:
+        The MapJob
+    """
+    fingerprint = fingerprint_file(csv_file)
+    with _jobs_lock:
+        job = _jobs.get(fingerprint)
+        if job is None:
+            job = _jobs[fingerprint] = MapJob(client, csv_file, fingerprint).start()
+        elif job.can_retry:
+            job.start()
+        return job
+
+
+def retry_map_job(job):
+    """Restart a job that failed with a transient error, if it has attempts left."""
+    with _jobs_lock:
+        if job.can_retry:
+            job.start()
+
+
+def reduce_summaries(client, question, summaries):
+    """
+    Merge partial summaries level by level until they fit in one prompt,
+    then answer the question from them. Each level runs concurrently, so
+    latency grows with the depth of the tree rather than the number of chunks.
+    The user is waiting on this step, so it runs at INTERACTIVE priority.
+    Args:
+        client: The rate limited Groq client
+        question: The user's question
+        summaries: Chunk summaries produced by map_chunks
+    Returns:
+        The final answer
+    """
+    separator = "\n\n---\n\n"
+    summaries = [summary + separator for summary in summaries]
+
+    while sum(count_tokens(summary) for summary in summaries) > CHUNK_TOKEN_BUDGET:
+        groups = list(pack_texts(summaries))
+        if len(groups) == len(summaries):
+            # Nothing can be merged further; answer from what fits
+            break
+        with ThreadPoolExecutor(max_workers=MAP_CONCURRENCY) as executor:
+            merged = list(executor.map(
+                lambda group: _complete(
+                    client, INTERACTIVE, REDUCE_PROMPT.format(question=question), group, REDUCE_MAX_TOKENS
+                ),
+                groups
+            ))
+        summaries = [summary + separator for summary in merged]
+
+    content = f"Dataset summaries:\n\"\"\"\n{''.join(summaries)}\"\"\"\n\nQuestion: {question}"
+    return _complete(client, INTERACTIVE, ANSWER_PROMPT, content, REDUCE_MAX_TOKENS)
+
+
+def answer_whole_dataset(client, question, job):
+    """
+    Answer a question that needs the whole scraped dataset using map-reduce.
+    The map step runs in the background (see start_map_job); until it has
+    finished this returns a progress message instead of waiting for it.
+    Args:
+        client: The rate limited Groq client
+        question: The user's question
+        job: The MapJob returned by start_map_job for the current dataset
+    Returns:
+        The answer text
+    """
+    retry_map_job(job)
+    if job.running:
+        progress = f"{job.done} of {job.total} parts summarised" if job.total else "preparing the data"
+        reply = f"I'm still reading through the whole dataset to answer questions like this one: {progress}."
+        if job.previous_error is not None:
+            reply += f" The previous attempt hit a temporary error and is being retried: {job.previous_error}."
+        return reply + " Please ask again in a moment."
+    if job.error is not None:
+        return f"An error occurred while summarising the dataset: {job.error}"
+
+    if not job.summaries:
+        return "The scraped dataset is empty, so there is nothing to summarise yet."
+    return reduce_summaries(client, question, job.summaries)
@@ -1,10 +1,12 @@
 import os
 import json
-from groq import Groq
+from groq_limiter import get_shared_client, count_tokens, BATCH
+from apify_pages import iter_dataset_pages, DATASET_PAGE_SIZE
 from apify_client import ApifyClient
 import uuid
 import pandas as pd
 import yaml  # Added for YAML processing
+from hashtag_index import HashtagIndex
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -20,13 +22,38 @@ if not GROQ_API_KEY:
 if not APIFY_API_TOKEN:
     raise ValueError("APIFY_API_TOKEN is not set in the .env file")
 
-# Create the Groq client
-groq_client = Groq(api_key=GROQ_API_KEY)
+# Create the rate limited Groq client (keyword generation runs as background work)
+groq_client = get_shared_client(GROQ_API_KEY)
 
 # Create the Apify client
 apify_client = ApifyClient(APIFY_API_TOKEN)
 
+# Hashtag index built alongside the CSV, reused for keyword expansion on the next scrape
+HASHTAG_INDEX_FILE = "hashtag_index.npz"
+
+# Columns produced by the normalization; every streamed chunk is aligned to these
+CSV_COLUMNS = [
+    'post_id', 'text', 'webVideoUrl', 'diggCount', 'shareCount', 'playCount', 'collectCount',
+    'commentCount', 'searchQuery', 'user_id', 'user_profileurl', 'user_signature', 'user_biolink',
+    'user_fans', 'user_heart', 'user_video', 'user_digg', 'coverUrl', 'hashtags_post'
+]
+
+# Columns stored as numbers in Parquet output (everything else is stored as text)
+NUMERIC_COLUMNS = [
+    'diggCount', 'shareCount', 'playCount', 'collectCount', 'commentCount',
+    'user_fans', 'user_heart', 'user_video', 'user_digg'
+]
+
 def main():
+    """
+    Run the pipeline: keywords, scrape, CSV, hashtag index and YAML.
+    The new CSV and hashtag index only replace the previous ones once the YAML
+    has been written as well, so the three outputs always belong to the same scrape.
+    Returns:
+        The estimated token count of the YAML output, or None if nothing was scraped
+    Raises:
+        Any error raised while downloading the dataset or writing the outputs
+    """
     # Load the summary from the file
     with open("summary.json", "r") as f:
         data = json.load(f)
@@ -37,22 +64,42 @@ def main():
 
     if keywords:
         print("Extracted Keywords:", keywords)
+        # Widen the search with hashtags that co-occurred with the keywords in the previous scrape
+        if os.path.exists(HASHTAG_INDEX_FILE):
+            keywords = HashtagIndex.load(HASHTAG_INDEX_FILE).expand_keywords(keywords)
+            print("Expanded Keywords:", keywords)
         # Scrape TikTok data using Apify
-        tiktok_data = scrape_tiktok(keywords)
-        if tiktok_data:
-            # Save the data to CSV
-            csv_filename = "tiktok_results.csv"
-            save_to_csv(tiktok_data, csv_filename)
-            print(f"Data saved to {csv_filename}")
-            
-            # Convert CSV to YAML and count tokens
-            yaml_string, token_count = csv_to_yaml_and_count_tokens(csv_filename)
-            # print(f"YAML String:\n{yaml_string}")
-            # print(f"Token Count: {token_count}")
+        dataset_id = run_tiktok_actor(keywords)
+        csv_filename = "tiktok_results.csv"
+        staged_csv = "tiktok_results.new.csv"
+        staged_index = "hashtag_index.new.npz"
+        row_count = 0
+        hashtag_index = HashtagIndex()
+        if dataset_id:
+            # Stream the dataset to CSV page by page instead of loading it all at once
+            row_count = stream_dataset_to_file(apify_client.dataset(dataset_id), staged_csv, hashtag_index=hashtag_index)
+        if row_count:
+            try:
+                hashtag_index.save(staged_index)
+
+                # Convert CSV to YAML and count tokens
+                token_count = csv_to_yaml_and_count_tokens(staged_csv)
+            except Exception:
+                for path in (staged_csv, staged_index):
+                    if os.path.exists(path):
+                        os.remove(path)
+                raise
+
+            os.replace(staged_csv, csv_filename)
+            os.replace(staged_index, HASHTAG_INDEX_FILE)
+            print(f"Data saved to {csv_filename} ({row_count} rows)")
+            print(f"Token Count: {token_count}")
+            return token_count
         else:
             print("No TikTok data found.")
     else:
         print("No keywords extracted.")
+    return None
 
 def generate_keywords(prompt):
     # Define the LLM prompt
@@ -85,7 +132,8 @@ def generate_keywords(prompt):
     messages = [{"role": "user", "content": formatted_prompt}]
 
     # Call the Groq API
-    response = groq_client.chat.completions.create(
+    response = groq_client.chat_completion(
+        priority=BATCH,
         model='llama3-8b-8192',
         response_format={"type": "json_object"},
         messages=messages
@@ -100,7 +148,14 @@ def generate_keywords(prompt):
         print("Failed to parse JSON response.")
         return []
 
-def scrape_tiktok(keywords):
+def run_tiktok_actor(keywords):
+    """
+    Run the TikTok scraper actor for the given keywords.
+    Args:
+        keywords: Search queries to scrape
+    Returns:
+        The id of the dataset holding the results, or None if the run failed
+    """
     # Prepare the run input for the Apify actor
     run_input = {
         "excludePinnedPosts": False,
@@ -117,14 +172,89 @@ def scrape_tiktok(keywords):
         run = apify_client.actor("clockworks/free-tiktok-scraper").call(run_input=run_input)
         if not run:
             return None
-
-        items = apify_client.dataset(run["defaultDatasetId"]).list_items().items
-        return items
+        return run["defaultDatasetId"]
 
     except Exception as e:
         print(f"Error during TikTok scraping: {e}")
         return None
 
+def stream_dataset_to_file(dataset_client, filename, page_size=DATASET_PAGE_SIZE, hashtag_index=None):
+    """
+    Normalize an Apify dataset page by page and append each chunk to a CSV or
+    Parquet file (chosen by the file extension), so peak memory depends on the
+    page size rather than on the size of the dataset. The chunks go to a
+    temporary file that only replaces `filename` once the whole dataset has
+    been written, so a failed download leaves the previous output intact.
+    Args:
+        dataset_client: The Apify dataset client to read from
+        filename: The .csv or .parquet file to write
+        page_size: Number of items normalized and written per chunk
+        hashtag_index: Optional HashtagIndex that every written chunk is added to
+    Returns:
+        The number of rows written
+    """
+    parquet = filename.endswith('.parquet')
+    tmp_filename = f"{filename}.tmp"
+    columns = None
+    dropped_columns = set()
+    parquet_writer = None
+    row_count = 0
+
+    try:
+        for items in iter_dataset_pages(dataset_client, page_size):
+            df = normalize_tiktok_data(items)
+
+            # Fix the column layout on the first chunk so every chunk matches the header
+            if columns is None:
+                columns = CSV_COLUMNS + [col for col in df.columns if col not in CSV_COLUMNS]
+            new_columns = [col for col in df.columns if col not in columns and col not in dropped_columns]
+            if new_columns:
+                print(f"Dropping columns missing from the first page (not in the header): {new_columns}")
+                dropped_columns.update(new_columns)
+            df = df.reindex(columns=columns, fill_value='')
+            if hashtag_index is not None:
+                hashtag_index.add_posts(df)
+
+            if parquet:
+                parquet_writer = _write_parquet_chunk(df, tmp_filename, parquet_writer)
+            else:
+                df.to_csv(tmp_filename, mode='w' if row_count == 0 else 'a', header=row_count == 0, index=False)
+            row_count += len(df)
+
+        if parquet_writer is not None:
+            parquet_writer.close()
+    except Exception:
+        if parquet_writer is not None:
+            parquet_writer.close()
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+
+    if row_count:
+        os.replace(tmp_filename, filename)
+    return row_count
+
+def _write_parquet_chunk(df, filename, writer):
+    # pyarrow is only needed for Parquet output
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Use a fixed schema: numbers for the count columns, text for everything else
+    df = df.copy()
+    for col in df.columns:
+        if col in NUMERIC_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+        else:
+            df[col] = df[col].astype(str)
+
+    if writer is None:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        writer = pq.ParquetWriter(filename, table.schema)
+    else:
+        table = pa.Table.from_pandas(df, schema=writer.schema, preserve_index=False)
+    writer.write_table(table)
+    return writer
+
 def save_to_csv(tiktok_data, filename):
     """
     Save the entire raw TikTok data to a CSV file using pandas.
@@ -132,6 +262,19 @@ def save_to_csv(tiktok_data, filename):
         tiktok_data: List of raw TikTok video data
         filename: The name of the CSV file to save the raw data
     """
+    df = normalize_tiktok_data(tiktok_data)
+
+    # Save the DataFrame to a CSV file
+    df.to_csv(filename, index=False)
+
+def normalize_tiktok_data(tiktok_data):
+    """
+    Flatten raw TikTok video data into the tabular layout used for the CSV output.
+    Args:
+        tiktok_data: List of raw TikTok video data
+    Returns:
+        A pandas DataFrame with one row per video
+    """
     # Convert the raw data into a pandas DataFrame
     df = pd.DataFrame(tiktok_data)
 
@@ -177,41 +320,38 @@ def save_to_csv(tiktok_data, filename):
     # Fill NaN values with an empty string
     df.fillna('', inplace=True)
 
-    # Save the DataFrame to a CSV file
-    df.to_csv(filename, index=False)
+    return df
     
-def csv_to_yaml_and_count_tokens(csv_file):
+def csv_to_yaml_and_count_tokens(csv_file, yaml_file_path="output.yaml", chunksize=DATASET_PAGE_SIZE):
     """
-    Convert a CSV file to YAML format and count tokens in the YAML string.
+    Convert a CSV file to YAML format chunk by chunk and count tokens in the YAML.
+    Only one chunk is held in memory; the YAML lists of consecutive chunks
+    concatenate into a single list.
     Args:
         csv_file: The CSV file to convert
+        yaml_file_path: The YAML file to write
+        chunksize: Number of rows converted at a time
     Returns:
-        yaml_multiline_string: The YAML string wrapped in triple quotes
-        token_count: The total number of tokens
+        token_count: The estimated number of tokens in the YAML
     """
+    tmp_path = f"{yaml_file_path}.tmp"
     try:
-        # Read the CSV file into a DataFrame
-        df = pd.read_csv(csv_file)
-        
-        # Convert DataFrame to a list of dictionaries
-        data = df.to_dict(orient='records')
-        
-        # Convert the data to a YAML string
-        yaml_string = yaml.dump(data, default_flow_style=False, sort_keys=False)
-        
-        # Wrap it in triple quotes
-        yaml_multiline_string = f"""\"\"\"\n{yaml_string}\"\"\""""
-
-        with open("output.yaml", 'w') as yaml_file:
-            yaml_file.write(yaml_string)
-        
-        # Count tokens by splitting on whitespace and other delimiters
-        tokens = yaml_string.split()
-        token_count = len(tokens)
-        
-        return yaml_multiline_string, token_count
+        token_count = 0
+        with open(tmp_path, 'w') as yaml_file:
+            # Read the CSV file in chunks and convert each one to YAML
+            for df in pd.read_csv(csv_file, chunksize=chunksize):
+                yaml_string = yaml.dump(df.to_dict(orient='records'), default_flow_style=False, sort_keys=False)
+                yaml_file.write(yaml_string)
+                token_count += count_tokens(yaml_string)
+
+        # Only replace the previous YAML once the new one is complete
+        os.replace(tmp_path, yaml_file_path)
+        return token_count
     except Exception as e:
-        print(f"An error occurred: {e}")
+        print(f"An error occurred while converting {csv_file} to YAML: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
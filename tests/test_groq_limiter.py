@@ -0,0 +1,169 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from groq import RateLimitError
+
+from groq_limiter import BATCH, INTERACTIVE, RateLimitedGroq, parse_reset_duration
+
+
+class FakeRawResponse:
+    def __init__(self, headers=None, total_tokens=10):
+        self.headers = headers or {}
+        self.total_tokens = total_tokens
+
+    def parse(self):
+        return SimpleNamespace(usage=SimpleNamespace(total_tokens=self.total_tokens))
+
+
+class FakeGroq:
+    """Stands in for groq.Groq: chat.completions.with_raw_response.create calls `handler`."""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.chat = SimpleNamespace(completions=SimpleNamespace(with_raw_response=self))
+
+    def create(self, **kwargs):
+        return self.handler(**kwargs)
+
+
+def rate_limit_error(retry_after="0"):
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    response = httpx.Response(429, headers={"retry-after": retry_after}, request=request)
+    return RateLimitError("rate limited", response=response, body=None)
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.001)
+
+
+def test_parse_reset_duration():
+    assert parse_reset_duration("7.66s") == pytest.approx(7.66)
+    assert parse_reset_duration("2m59.56s") == pytest.approx(179.56)
+    assert parse_reset_duration("250ms") == pytest.approx(0.25)
+    assert parse_reset_duration("2") == 2.0
+    assert parse_reset_duration(None) is None
+
+
+def test_interactive_preempts_batch_and_keeps_last_slot():
+    started = []
+    gates = {}
+
+    def handler(tag, **kwargs):
+        started.append(tag)
+        gates[tag].wait(timeout=5)
+        return FakeRawResponse()
+
+    limiter = RateLimitedGroq(
+        FakeGroq(handler), requests_per_minute=1000, tokens_per_minute=10**6, initial_concurrency=1
+    )
+
+    def call(tag, priority):
+        gates[tag] = threading.Event()
+        thread = threading.Thread(
+            target=limiter.chat_completion, kwargs={"priority": priority, "tag": tag, "messages": []}
+        )
+        thread.start()
+        return thread
+
+    threads = [call("batch-1", BATCH)]
+    wait_until(lambda: started == ["batch-1"])
+
+    # The concurrency limit is 1 and BATCH holds it, yet INTERACTIVE is not queued behind it
+    threads.append(call("interactive-1", INTERACTIVE))
+    wait_until(lambda: "interactive-1" in started)
+
+    threads.append(call("batch-2", BATCH))
+    wait_until(lambda: len(limiter._waiting) == 1)
+    threads.append(call("interactive-2", INTERACTIVE))
+    wait_until(lambda: len(limiter._waiting) == 2)
+
+    # Freeing the batch slot admits the later INTERACTIVE call, not the earlier BATCH one
+    gates["batch-1"].set()
+    wait_until(lambda: "interactive-2" in started)
+    assert "batch-2" not in started
+
+    for gate in gates.values():
+        gate.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert started == ["batch-1", "interactive-1", "interactive-2", "batch-2"]
+
+
+def test_429_is_retried_and_halves_concurrency():
+    calls = []
+
+    def handler(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise rate_limit_error()
+        return FakeRawResponse()
+
+    limiter = RateLimitedGroq(
+        FakeGroq(handler), requests_per_minute=1000, tokens_per_minute=10**6, initial_concurrency=4
+    )
+    completion = limiter.chat_completion(priority=INTERACTIVE, messages=[])
+
+    assert completion.usage.total_tokens == 10
+    assert len(calls) == 2
+    # Halved from 4 to 2 by the 429, then one additive step of 1/2 for the success
+    assert limiter.concurrency_limit == pytest.approx(2.5)
+    assert limiter._in_flight == 0
+
+
+def test_429_after_last_retry_is_raised():
+    def handler(**kwargs):
+        raise rate_limit_error()
+
+    limiter = RateLimitedGroq(
+        FakeGroq(handler), requests_per_minute=1000, tokens_per_minute=10**6,
+        initial_concurrency=8, max_retries=1
+    )
+    with pytest.raises(RateLimitError):
+        limiter.chat_completion(priority=BATCH, messages=[])
+
+    assert limiter.concurrency_limit == pytest.approx(2.0)
+    assert limiter._in_flight == 0
+
+
+def test_batch_cannot_use_reserved_budget():
+    limiter = RateLimitedGroq(FakeGroq(None), requests_per_minute=1000, tokens_per_minute=1000)
+    now = limiter.token_bucket.updated
+    # 250 tokens left: enough for the call, but it would eat into the 20% (200 token) reserve
+    limiter.token_bucket.tokens = 250
+
+    limiter._waiting = [(BATCH, 0)]
+    assert limiter._admission_delay((BATCH, 0), 100, now) > 0
+
+    limiter._waiting = [(INTERACTIVE, 1)]
+    assert limiter._admission_delay((INTERACTIVE, 1), 100, now) == 0
+
+
+def test_headers_block_exhausted_bucket():
+    limiter = RateLimitedGroq(FakeGroq(None), requests_per_minute=1000, tokens_per_minute=1000)
+    now = limiter.token_bucket.updated
+    limiter._observe_headers(
+        {"x-ratelimit-remaining-tokens": "0", "x-ratelimit-reset-tokens": "2.5s"}, now
+    )
+    assert limiter.token_bucket.wait_time(1, 0, now) == pytest.approx(2.5)
+
+
+def test_batch_call_larger_than_batch_budget_is_rejected():
+    limiter = RateLimitedGroq(FakeGroq(None), requests_per_minute=1000, tokens_per_minute=6000)
+    assert limiter.max_batch_tokens == 4800
+
+    # A full bucket is not enough: admitting it would leave less than the 1200 token reserve
+    messages = [{"role": "user", "content": "x" * 20000}]
+    with pytest.raises(ValueError):
+        limiter.chat_completion(priority=BATCH, messages=messages, max_tokens=512)
+    assert limiter.token_bucket.tokens == 6000
+
+    now = limiter.token_bucket.updated
+    limiter._waiting = [(BATCH, 0)]
+    assert limiter._admission_delay((BATCH, 0), 4800, now) == 0
+    assert limiter._admission_delay((BATCH, 0), 4801, now) > 0
@@ -0,0 +1,53 @@
+import pandas as pd
+
+from hashtag_index import HashtagIndex
+
+
+def build_index():
+    index = HashtagIndex()
+    index.add_posts(pd.DataFrame({
+        "post_id": ["1", "2", "3", "4"],
+        "user_id": ["a", "b", "a", "c"],
+        "user_profileurl": ["https://www.tiktok.com/@a", "https://www.tiktok.com/@b",
+                            "https://www.tiktok.com/@a", "https://www.tiktok.com/@c"],
+        "playCount": [1000, 5000, 2000, 100],
+        "diggCount": [100, 900, 50, 10],
+        "commentCount": [10, 50, 5, 1],
+        "shareCount": [5, 20, 1, 0],
+        "collectCount": [1, 30, 0, 0],
+        "hashtags_post": ["footballedit, fyp", "footballedit, football", "footballedit, fyp, fyp", "cooking"],
+    }))
+    return index
+
+
+def test_top_creators_and_stats():
+    index = build_index()
+    top = index.top_creators("#footballedit")
+    assert [creator["creator_id"] for creator in top] == ["b", "a"]
+    assert top[1]["posts"] == 2
+    assert top[1]["engagement"] == 100 + 10 + 5 + 1 + 50 + 5 + 1
+    assert index.hashtag_stats("FootballEdit")["posts"] == 3
+    assert sorted(index.posts_for("fyp")) == ["1", "3"]
+
+
+def test_related_hashtags_and_keyword_expansion():
+    index = build_index()
+    assert index.related_hashtags("footballedit") == [("fyp", 2), ("football", 1)]
+    assert index.expand_keywords(["footballedit", "UK"], per_keyword=1) == ["footballedit", "UK", "fyp"]
+
+
+def test_find_hashtags_in_chat_messages():
+    index = build_index()
+    assert index.find_hashtags("Which creators post #footballedit.") == ["footballedit"]
+    assert index.find_hashtags("Which creators post footballedit?") == ["footballedit"]
+    assert index.find_hashtags("Which creators post footballedit?", include_words=False) == []
+    assert index.describe_hashtags("Which creators post #footballedit.").startswith("#footballedit: 3 posts")
+
+
+def test_save_and_load(tmp_path):
+    index = build_index()
+    path = tmp_path / "hashtag_index.npz"
+    index.save(path)
+    loaded = HashtagIndex.load(path)
+    assert loaded.top_creators("footballedit") == index.top_creators("footballedit")
+    assert loaded.related_hashtags("fyp") == index.related_hashtags("fyp")
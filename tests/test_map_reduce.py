@@ -0,0 +1,118 @@
+import threading
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from groq import APITimeoutError, AuthenticationError
+
+import map_reduce
+
+
+class FakeClient:
+    """Stands in for RateLimitedGroq: answers every call with a fixed summary."""
+
+    def __init__(self, fail_on=None, error=None):
+        self.fail_on = fail_on
+        self.error = error or RuntimeError("rate limited")
+        self.max_batch_tokens = 24000
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def chat_completion(self, priority, **kwargs):
+        content = kwargs["messages"][1]["content"]
+        with self.lock:
+            self.calls.append((priority, content))
+        if self.fail_on is not None and self.fail_on in content:
+            raise self.error
+        message = SimpleNamespace(content=f"summary of {len(content)} chars")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(map_reduce, "CACHE_DIR", str(tmp_path / "map_cache"))
+    monkeypatch.setattr(map_reduce, "_jobs", {})
+
+
+def write_csv(tmp_path, rows=200):
+    csv_file = tmp_path / "tiktok_results.csv"
+    lines = "\n".join(f"{index},creator{index},{'x' * 400}" for index in range(rows))
+    csv_file.write_text("post_id,user_id,text\n" + lines + "\n")
+    return str(csv_file)
+
+
+def api_request():
+    return httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+
+
+def test_failed_chunk_keeps_finished_summaries():
+    chunks = [f"chunk {index}" for index in range(8)]
+
+    first = FakeClient(fail_on="chunk 5")
+    with pytest.raises(RuntimeError):
+        map_reduce.map_chunks(first, iter(chunks), "fingerprint")
+    # No new calls are started once a chunk has failed
+    assert len(first.calls) < 8
+
+    # Only the chunks that were not summarised are mapped on the next attempt
+    client = FakeClient()
+    summaries = map_reduce.map_chunks(client, iter(chunks), "fingerprint")
+    assert len(summaries) == 8
+    mapped_before = {content for _, content in first.calls} - {"chunk 5"}
+    assert "chunk 5" in [content for _, content in client.calls]
+    assert not mapped_before & {content for _, content in client.calls}
+
+
+def test_map_job_reports_progress_and_follow_up_only_reduces(tmp_path):
+    client = FakeClient()
+    job = map_reduce.start_map_job(client, write_csv(tmp_path))
+    job._thread.join(timeout=10)
+    assert job.summaries is not None
+    assert job.done == job.total > 1
+    assert all(priority == map_reduce.BATCH for priority, _ in client.calls)
+
+    client.calls.clear()
+    map_reduce.answer_whole_dataset(client, "What are the themes?", job)
+    # Maps are reused; only the final answer runs, at INTERACTIVE priority
+    assert [priority for priority, _ in client.calls] == [map_reduce.INTERACTIVE]
+
+
+def test_permanent_error_is_reported_without_restarting(tmp_path):
+    response = httpx.Response(401, request=api_request())
+    client = FakeClient(fail_on="", error=AuthenticationError("401 invalid api key", response=response, body=None))
+    job = map_reduce.start_map_job(client, write_csv(tmp_path, rows=20))
+    job._thread.join(timeout=10)
+
+    reply = map_reduce.answer_whole_dataset(client, "What are the themes?", job)
+    assert reply == "An error occurred while summarising the dataset: 401 invalid api key"
+    assert job.attempts == 1
+
+
+def test_transient_error_is_retried_up_to_the_limit(tmp_path):
+    client = FakeClient(fail_on="", error=APITimeoutError(request=api_request()))
+    job = map_reduce.start_map_job(client, write_csv(tmp_path, rows=20))
+    job._thread.join(timeout=10)
+
+    for attempt in range(2, map_reduce.MAX_MAP_ATTEMPTS + 1):
+        reply = map_reduce.answer_whole_dataset(client, "What are the themes?", job)
+        assert job.attempts == attempt
+        assert "being retried" in reply
+        job._thread.join(timeout=10)
+
+    reply = map_reduce.answer_whole_dataset(client, "What are the themes?", job)
+    assert reply.startswith("An error occurred while summarising the dataset")
+    assert job.attempts == map_reduce.MAX_MAP_ATTEMPTS
+
+
+def test_chunks_shrink_to_fit_the_batch_quota():
+    client = FakeClient()
+    assert map_reduce.chunk_token_budget(client) == map_reduce.CHUNK_TOKEN_BUDGET
+
+    # 6000 tokens per minute leave 4800 for BATCH calls, so a 5000 token chunk never fits
+    client.max_batch_tokens = 4800
+    budget = map_reduce.chunk_token_budget(client)
+    chunk = "x" * (budget * 4)
+    estimate = map_reduce.estimate_tokens(
+        [{"content": map_reduce.MAP_PROMPT}, {"content": chunk}], map_reduce.MAP_MAX_TOKENS
+    )
+    assert estimate <= 4800
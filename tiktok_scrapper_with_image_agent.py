@@ -3,7 +3,9 @@ from apify_client import ApifyClient
 from dotenv import load_dotenv
 import sys
 import json
+import itertools
 import requests
+from apify_pages import iter_dataset_pages
 from camel.agents import ChatAgent
 from camel.messages import BaseMessage
 from camel.configs.openai_config import ChatGPTConfig
@@ -125,17 +127,30 @@ class TikTokScraper:
                 return None
             
             force_print(f"Apify actor run finished. Run ID: {run['id']}")
-            force_print("Fetching results from Apify...")
+            force_print("Streaming results from Apify...")
             
-            items = self.client.dataset(run["defaultDatasetId"]).list_items().items
-            force_print(f"Fetched {len(items)} items from Apify")
-            
-            return items
+            # Items are fetched lazily while the caller iterates
+            return self._iterate_dataset(run["defaultDatasetId"])
 
         except Exception as e:
             force_print(f"Error during scraping: {str(e)}")
             return None
 
+    def _iterate_dataset(self, dataset_id):
+        """
+        Yield dataset items one page at a time so large runs are never held in memory.
+        Errors while fetching a page are logged and end the iteration early,
+        the same way _execute_scrape logs errors instead of raising them.
+        """
+        fetched = 0
+        try:
+            for items in iter_dataset_pages(self.client.dataset(dataset_id)):
+                fetched += len(items)
+                force_print(f"Fetched {fetched} items from Apify")
+                yield from items
+        except Exception as e:
+            force_print(f"Error while fetching results from Apify: {str(e)}")
+
 def create_demographic_agent():
     """Create a CAMEL agent for analyzing creator demographics and NSFW content"""
     
@@ -280,16 +295,20 @@ def main():
         
         # Example usage
         # By username
-        username_results = scraper.scrape_by_username("example_user", max_videos=5)
-        if username_results:
+        username_results = scraper.scrape_by_username("example_user", max_videos=5) or iter(())
+        first_result = next(username_results, None)
+        if first_result:
             force_print("\nResults by username:")
-            force_print(json.dumps(username_results[0], indent=2))  # Print first result as example
+            force_print(json.dumps(first_result, indent=2))  # Print first result as example
+            username_results = itertools.chain([first_result], username_results)
         
         # By search query
-        search_results = scraper.scrape_by_search("example search", max_videos=5)
-        if search_results:
+        search_results = scraper.scrape_by_search("example search", max_videos=5) or iter(())
+        first_result = next(search_results, None)
+        if first_result:
             force_print("\nResults by search:")
-            force_print(json.dumps(search_results[0], indent=2))  # Print first result as example
+            force_print(json.dumps(first_result, indent=2))  # Print first result as example
+            search_results = itertools.chain([first_result], search_results)
         
         # Send data to Xano
         send_to_xano(username_results)